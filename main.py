@@ -10,31 +10,89 @@ import time
 import argparse
 import threading
 import socket
-from datetime import datetime
+import sqlite3
+import hashlib
 import textwrap
-from typing import Any, Dict, List, Optional
+import math
+import heapq
+import copy
+import enum
+import logging
+from collections import Counter, OrderedDict, deque
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 import sys
 import shutil
 import subprocess
 
-# Selenium
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-
-# Auto-manage driver (avoids version hell)
+# Selenium and webdriver_manager are imported by _lazy_selenium() on the first BrowserAgent,
+# so --help and the LLM-only code paths don't pay their cold-import cost.
+_SELENIUM_LOADED = False
+HAVE_WDM = False
+
+
+def _lazy_selenium() -> None:
+    global _SELENIUM_LOADED, HAVE_WDM, ChromeDriverManager
+    global webdriver, Service, By, NoSuchElementException, StaleElementReferenceException, TimeoutException, WebDriverException
+    global Keys, Options, WebDriverWait, EC
+    if _SELENIUM_LOADED:
+        return
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.by import By
+    from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException, WebDriverException
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    # Auto-manage driver (avoids version hell)
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        HAVE_WDM = True
+    except Exception:
+        HAVE_WDM = False
+    _SELENIUM_LOADED = True
+
+# Diagnostics ([INFO]/[WARNING]/[ERROR]) go through one logger; page output and plans stay on print
+log = logging.getLogger("clunkyquery")
+if not log.handlers:
+    _log_handler = logging.StreamHandler(sys.stdout)
+    _log_handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+    log.addHandler(_log_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+# Faster JSON (optional); falls back to stdlib json
 try:
-    from webdriver_manager.chrome import ChromeDriverManager
-    HAVE_WDM = True
+    import orjson
+    HAVE_ORJSON = True
 except Exception:
-    HAVE_WDM = False
+    HAVE_ORJSON = False
+
+
+def _json_loads(s: Any) -> Any:
+    # Accepts str or bytes; orjson parses bytes directly without a decode step
+    if HAVE_ORJSON:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def _json_dumps(obj: Any, sort_keys: bool = False, indent: bool = False) -> str:
+    # Non-ASCII is kept as-is and unknown types fall back to str(), so logging never fails
+    if HAVE_ORJSON:
+        opt = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            opt |= orjson.OPT_SORT_KEYS
+        if indent:
+            opt |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=opt, default=str).decode("utf-8")
+    return json.dumps(obj, sort_keys=sort_keys, indent=2 if indent else None, ensure_ascii=False, default=str)
 
 # OpenAI-compatible provider endpoints (used if --endpoint not provided)
 PROVIDER_ENDPOINTS = {
@@ -42,6 +100,15 @@ PROVIDER_ENDPOINTS = {
     "openai": "https://api.openai.com/v1",
     "together": "https://api.together.xyz/v1",
 }
+_PROVIDER_CHOICES = tuple(sorted(PROVIDER_ENDPOINTS))
+
+# Global cross-agent visited URL tracking (normalized URLs; writes take the lock)
+GLOBAL_VISITED_URLS: set[str] = set()
+GLOBAL_VISITED_LOCK = threading.Lock()
+
+# Whether we're on a Linux box without a GUI session (checked once at import).
+# Only apply DISPLAY/WAYLAND checks on Linux; Windows/macOS don't set these in normal GUI sessions.
+_LINUX_NO_DISPLAY = sys.platform.startswith("linux") and not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
 
 # Model and API key may be provided via environment variables, but no hardcoded secrets.
 DEFAULT_MODEL = os.environ.get("LLM_MODEL", "llama-3.3-70b-versatile")
@@ -97,69 +164,157 @@ Requirements:
 - Do NOT mention automation steps, retries, or duplicates.
 """
 
+# Precompiled patterns used on every agent turn
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.MULTILINE)
+_WORD_RE = re.compile(r"[a-zA-Z0-9_+\-]{3,}")
+_WS_NL_RE = re.compile(r"\s+\n")
+_MULTI_NL_RE = re.compile(r"\n{3,}")
+_HAS_TEXT_RE = re.compile(r"^([a-zA-Z0-9_*\-]+)?\s*:\s*has-text\((['\"])\s*(.*?)\s*\2\)\s*$")
+_CSS_SENTINEL_RE = re.compile(r"[\.#\[:]")
+_DIGITS_RE = re.compile(r"\d+")
+# Substring prefilter for Google URLs; covers every ccTLD (google.com, google.co.uk, google.de, ...)
+_GOOGLE_TOKEN = "google."
+# First non-empty q= query parameter (fragment excluded)
+_GOOGLE_Q_RE = re.compile(r"^[^#]*?[?&]q=([^&#]+)")
+# Loose model-JSON recovery
+_JSON_TOKEN_RE = re.compile(r'"(?:\\.|[^"\\])*(")?|\'(?:\\.|[^\'\\])*(\')?|[{}]', re.DOTALL)
+_LINE_COMMENT_RE = re.compile(r"(^|\s)//.*$", re.MULTILINE)
+_BLOCK_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_JS_TRUE_RE = re.compile(r"(?<![A-Za-z0-9_])true(?![A-Za-z0-9_])")
+_JS_FALSE_RE = re.compile(r"(?<![A-Za-z0-9_])false(?![A-Za-z0-9_])")
+_JS_NULL_RE = re.compile(r"(?<![A-Za-z0-9_])null(?![A-Za-z0-9_])")
+
 def strip_code_fences(s: str) -> str:
     # Remove ```json ... ``` wrappers if model adds them
-    fence = re.compile(r"^```(?:json)?\s*|\s*```$", re.MULTILINE)
-    return fence.sub("", s).strip()
+    return _FENCE_RE.sub("", s).strip()
 
 # Relevance filtering helpers
-STOPWORDS = {
+STOPWORDS = frozenset({
     'the','a','an','and','or','but','for','to','of','on','in','at','by','with','as',
     'is','are','was','were','be','been','from','that','this','it','its','you','your',
     'we','our','they','their','about','over','into','out','more','most','can','will',
     'may','might','should','would','could','if','than','then','so','such','up','down',
-}
+})
 
 def extract_keywords(text: str) -> List[str]:
-    words = re.findall(r"[a-zA-Z0-9_+\-]{3,}", (text or "").lower())
-    kws = [w for w in words if w not in STOPWORDS]
-    seen = set()
-    out: List[str] = []
-    for w in kws:
-        if w not in seen:
-            seen.add(w)
-            out.append(w)
-    return out[:30]
+    words = _WORD_RE.findall((text or "").lower())
+    # dict.fromkeys dedups in C while keeping first-seen order
+    kws = (w for w in words if w not in STOPWORDS)
+    return list(dict.fromkeys(kws))[:30]
+
+# Compiled keyword alternation plus, per keyword, the set of keywords it contains
+_KeywordMatcher = Tuple["re.Pattern[str]", Dict[str, frozenset]]
+
+@functools.lru_cache(maxsize=32)
+def _keyword_matcher(keywords: Tuple[str, ...]) -> _KeywordMatcher:
+    # Single alternation so each line is scanned once for all keywords.
+    # Lookahead lets matches overlap; longest first so prefixes don't shadow longer keywords.
+    alts = sorted(set(keywords), key=len, reverse=True)
+    kw_re = re.compile("(?=(" + "|".join(re.escape(k) for k in alts) + "))")
+    # A match also hides shorter keywords starting at the same spot; credit them too
+    covers = {k: frozenset(o for o in alts if o in k) for k in alts}
+    return kw_re, covers
+
+def _keyword_hits(matcher: _KeywordMatcher, text: str, stop_at: int = 0) -> set:
+    # Distinct keywords found in text; with stop_at, quit scanning once that many are found
+    kw_re, covers = matcher
+    hits: set = set()
+    for m in kw_re.finditer(text):
+        hits |= covers[m.group(1)]
+        if stop_at and len(hits) >= stop_at:
+            break
+    return hits
+
+def _has_keywords(matcher: _KeywordMatcher, text: str, need: int) -> bool:
+    # Loose mode only needs one match, which a single search answers without collecting hits
+    if need <= 1:
+        return matcher[0].search(text) is not None
+    return len(_keyword_hits(matcher, text, need)) >= need
 
-def filter_text_by_keywords(text: str, keywords: List[str], mode: str = 'loose', max_lines: int = 80) -> str:
+def filter_text_by_keywords(text: str, keywords: List[str], mode: str = 'loose', max_lines: int = 80, matcher: Optional[_KeywordMatcher] = None) -> str:
     if mode == 'off' or not keywords or not text:
         return text
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
     kept: List[str] = []
     need = 2 if mode == 'strict' else 1
-    kw_set = set(keywords)
-    for ln in lines:
-        ln_low = ln.lower()
+    if matcher is None:
+        matcher = _keyword_matcher(tuple(keywords))
+    # Lowercase once up front; case mapping never adds or removes line breaks, so both splits stay aligned
+    for raw, ln_low in zip(text.splitlines(), text.lower().splitlines()):
+        ln = raw.strip()
+        if not ln:
+            continue
         # Always keep headings
         if ln.startswith('== ') or ln.startswith('# '):
             kept.append(ln)
             continue
-        hits = sum(1 for k in kw_set if k in ln_low)
-        if hits >= need:
+        if _has_keywords(matcher, ln_low, need):
             kept.append(ln)
         if len(kept) >= max_lines:
             break
     if not kept:
-        kept = lines[: min(10, len(lines))]
+        for raw in text.splitlines():
+            ln = raw.strip()
+            if ln:
+                kept.append(ln)
+                if len(kept) >= 10:
+                    break
     return "\n".join(kept)
 
-def filter_links_by_keywords(links: List[Dict[str,str]], keywords: List[str], mode: str = 'loose', max_keep: int = 10) -> List[Dict[str,str]]:
+def _scored_links(links: List[Dict[str,str]], matcher: _KeywordMatcher, need: int) -> Iterator[Tuple[Tuple[int, bool, int], Dict[str,str]]]:
+    for idx, lk in enumerate(links):
+        # One scan over text and href; the newline keeps matches from spanning the two
+        blob = ((lk.get('text') or '') + '\n' + (lk.get('href') or '')).lower()
+        hits = len(_keyword_hits(matcher, blob))
+        if hits >= need:
+            # More distinct keywords first; among equals, links not yet visited, then page order
+            yield (hits, not lk.get('clicked'), -idx), lk
+
+def filter_links_by_keywords(links: List[Dict[str,str]], keywords: List[str], mode: str = 'loose', max_keep: int = 10, matcher: Optional[_KeywordMatcher] = None) -> List[Dict[str,str]]:
     if mode == 'off' or not keywords or not links:
         return links[:max_keep]
     need = 2 if mode == 'strict' else 1
-    kw_set = set(keywords)
-    matched: List[Dict[str,str]] = []
-    for lk in links:
-        text = (lk.get('text') or '').lower()
-        href = (lk.get('href') or '').lower()
-        hits = sum(1 for k in kw_set if k in text or k in href)
-        if hits >= need:
-            matched.append(lk)
-        if len(matched) >= max_keep:
-            break
-    if not matched:
+    if matcher is None:
+        matcher = _keyword_matcher(tuple(keywords))
+    # Streaming top-K: only max_keep candidates are ever held, then restored to page order
+    top = heapq.nlargest(max_keep, _scored_links(links, matcher, need), key=lambda p: p[0])
+    if not top:
         return links[:max_keep]
-    return matched[:max_keep]
+    return [lk for _, lk in sorted(top, key=lambda p: -p[0][2])]
+
+def _body_text(resp: Any) -> str:
+    # JSON APIs send UTF-8; decode directly rather than letting requests sniff the charset
+    ctype = (resp.headers.get("Content-Type") or "").lower()
+    if "json" in ctype or "utf-8" in ctype:
+        return resp.content.decode("utf-8", errors="replace")
+    return resp.text
+
+class _ChatCache:
+    """On-disk cache of chat completions keyed by a hash of the request."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        # Shared by agent threads; access is serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response BLOB, ts INTEGER)")
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        return row[0].decode("utf-8") if row else None
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, ts) VALUES (?, ?, ?)",
+                (key, response.encode("utf-8"), int(time.time())),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
 
 class LLMClient:
     def __init__(self, api_key: str, model: str, endpoint: str):
@@ -167,8 +322,33 @@ class LLMClient:
         self.model = model
         self.endpoint = endpoint.rstrip("/")
         self.url = f"{self.endpoint}/chat/completions"
+        # Reuse connections across turns (and agent threads) instead of a fresh TLS handshake per call
+        self._session = requests.Session()
+        self._session.mount(self.endpoint + "/", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        # Identical requests are answered from disk; set LLM_CACHE_DISABLE=1 to always hit the API
+        self._cache: Optional[_ChatCache] = None
+        if os.environ.get("LLM_CACHE_DISABLE") != "1":
+            try:
+                self._cache = _ChatCache(os.environ.get("LLM_CACHE_PATH", "llm_cache.db"))
+            except Exception as e:
+                log.warning("LLM response cache unavailable (%s).", e)
+
+    def close(self):
+        try:
+            self._session.close()
+        except Exception:
+            pass
+        if self._cache is not None:
+            try:
+                self._cache.close()
+            except Exception:
+                pass
+            self._cache = None
 
-    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.2) -> str:
+    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.2, validate: Optional[Callable[[str], Any]] = None, cache: bool = True) -> str:
+        # validate (if given) is called on a fresh reply before it is cached; if it raises, the
+        # reply is not stored, so a malformed answer can't be replayed to every later run.
+        # cache=False bypasses the reply cache for this call in both directions.
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -178,21 +358,125 @@ class LLMClient:
             "messages": messages,
             "temperature": temperature,
         }
-        resp = requests.post(self.url, headers=headers, json=payload, timeout=120)
+        # Keyed with the stdlib encoder at fixed settings: _json_dumps output differs with and without
+        # orjson, and environments sharing one cache file must agree on keys
+        key = hashlib.sha256(
+            json.dumps(
+                {"e": self.endpoint, "m": self.model, "t": temperature, "msgs": messages},
+                sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+            ).encode("utf-8")
+        ).hexdigest()
+        if cache and self._cache is not None:
+            try:
+                hit = self._cache.get(key)
+                if hit is not None:
+                    return hit
+            except Exception:
+                pass
+        resp = self._session.post(self.url, headers=headers, json=payload, timeout=120)
         if not resp.ok:
             # Provide clearer diagnostics for common misconfigurations
             detail = ""
             try:
-                err = resp.json()
-                detail = json.dumps(err)
+                err = _json_loads(resp.content)
+                detail = _json_dumps(err)
             except Exception:
-                detail = resp.text
+                detail = _body_text(resp)
             raise RuntimeError(
                 "LLM request failed. "
                 f"status={resp.status_code} endpoint={self.endpoint} model={self.model} detail={detail}"
             )
-        data = resp.json()
-        return data["choices"][0]["message"]["content"]
+        data = _json_loads(resp.content)
+        content = data["choices"][0]["message"]["content"]
+        if validate is not None:
+            validate(content)
+        if cache and self._cache is not None:
+            try:
+                self._cache.put(key, content)
+            except Exception:
+                pass
+        return content
+
+# Page-side helpers for scraping. Pinned once per browser via CDP so each call
+# only ships a short invocation instead of re-sending (and re-parsing) this source.
+_PAGE_HELPERS_JS = r"""
+(function(){
+  function visible(el, minPx){
+    // Cheap reject first: unrendered nodes (display:none self/ancestor) have no offsetParent and no boxes.
+    // Fixed-position nodes also lack an offsetParent but do have boxes, so they fall through.
+    if (el.offsetParent === null && el.getClientRects().length === 0) return false;
+    const WH = window.innerHeight, WW = window.innerWidth;
+    const cs = getComputedStyle(el);
+    if (cs.display === 'none' || cs.visibility === 'hidden' || parseFloat(cs.opacity||'1') === 0) return false;
+    const r = el.getBoundingClientRect();
+    if (r.bottom <= 0 || r.top >= WH || r.right <= 0 || r.left >= WW) return false;
+    const vert = Math.min(WH, r.bottom) - Math.max(0, r.top);
+    const horiz = Math.min(WW, r.right) - Math.max(0, r.left);
+    return vert >= minPx && horiz >= minPx;
+  }
+  function norm(s){ return (s||'').replace(/\s+/g,' ').trim(); }
+  // Slice by UTF-16 units without leaving half a surrogate pair behind
+  function clip(s, n){
+    s = s.slice(0, n);
+    return /[\uD800-\uDBFF]$/.test(s) ? s.slice(0, -1) : s;
+  }
+
+  window.__cq_scrape = function(MAX){
+    const selectors = 'h1,h2,h3,h4,h5,h6,main,article,section,p,li,a,button,[role=button],[role=link]';
+    const nodes = Array.from(document.querySelectorAll(selectors));
+    const seen = new Set();
+    const items = [];
+    for (const el of nodes){
+      if (!visible(el, 20)) continue;
+      let txt = norm(el.innerText || el.textContent || '');
+      if (!txt || txt.length < 2) continue;
+      const r = el.getBoundingClientRect();
+      const tag = el.tagName.toLowerCase();
+      const href = (tag === 'a' && el.href) ? el.href : null;
+      const key = tag+':'+txt.slice(0,120)+':' + (href||'');
+      if (seen.has(key)) continue;
+      seen.add(key);
+      items.push({tag, txt, href, top:r.top, left:r.left});
+    }
+    items.sort((a,b)=> a.top - b.top || a.left - b.left);
+    const lines = [];
+    let total = 0;
+    for (const it of items){
+      let line;
+      if (it.tag === 'h1') line = '== ' + it.txt + ' ==';
+      else if (it.tag === 'h2') line = '# ' + it.txt;
+      else if (it.tag === 'h3') line = '## ' + it.txt;
+      else if (it.tag === 'a') line = it.href ? ('• ' + it.txt + ' — ' + it.href) : ('• ' + it.txt);
+      else if (it.tag === 'button') line = '[button] ' + it.txt;
+      else line = it.txt;
+      lines.push(line);
+      total += line.length + 1;
+      if (total >= MAX) break;
+    }
+    // The last line can be a whole <main>/<article>; ship only what the caller keeps.
+    // Cap is in UTF-16 units with slack so Python still sees > MAX characters and adds the ellipsis.
+    const out = lines.join('\n');
+    return out.length > 2 * MAX + 8 ? clip(out, 2 * MAX + 8) : out;
+  };
+
+  window.__cq_links = function(LIMIT){
+    const nodes = Array.from(document.querySelectorAll('a[href^="http"]'));
+    const items = [];
+    for (const el of nodes){
+      if (!visible(el, 12)) continue;
+      // Python keeps 120 characters; 242 UTF-16 units always covers that
+      const txt = clip(norm(el.innerText || el.textContent || ''), 242);
+      const href = el.href;
+      if (!href) continue;
+      const r = el.getBoundingClientRect();
+      items.push({text: txt, href: href, top: r.top, left: r.left});
+    }
+    items.sort((a,b)=> a.top - b.top || a.left - b.left);
+    // Only ship what the caller keeps (the Python loop always keeps at least one)
+    return items.slice(0, Math.max(1, LIMIT | 0));
+  };
+})();
+"""
 
 def _find_free_port() -> int:
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -202,39 +486,135 @@ def _find_free_port() -> int:
     return int(port)
 
 
+# Query-param prefixes that only track the click, not the page
+_TRACKING_PARAMS = ("utm_", "gclid", "fbclid")
+
+
+# URL helpers are pure and see the same hrefs over and over; cache them process-wide
+@functools.lru_cache(maxsize=4096)
+def _norm_url_impl(url: str) -> str:
+    try:
+        # Normalize scheme/host lowercase, drop fragment, clean trailing slash
+        p = urllib.parse.urlsplit(url)
+        scheme = (p.scheme or '').lower()
+        netloc = (p.netloc or '').lower()
+        path = p.path or '/'
+        if path != '/' and path.endswith('/'):
+            path = path[:-1]
+        q = p.query
+        if q and any(t in q for t in _TRACKING_PARAMS):
+            # Drop click-tracking params so the same page reached via an ad/share link dedups
+            kept = [(k, v) for k, v in urllib.parse.parse_qsl(q, keep_blank_values=True) if not k.startswith(_TRACKING_PARAMS)]
+            q = urllib.parse.urlencode(kept)
+        query = (('?' + q) if q else '')
+        return f"{scheme}://{netloc}{path}{query}"
+    except Exception:
+        return url
+
+
+def _page_signature(text: str) -> bytes:
+    # Content fingerprint; digits are dropped so counters and timestamps don't make a page look new
+    return hashlib.blake2b(_DIGITS_RE.sub("", text).encode("utf-8", "replace"), digest_size=8).digest()
+
+
+@functools.lru_cache(maxsize=2048)
+def _dup_exempt_impl(url: str) -> bool:
+    """Return True if this URL should never be considered a duplicate.
+    Exempts all DuckDuckGo hosts (e.g., duckduckgo.com, lite.duckduckgo.com).
+    """
+    try:
+        p = urllib.parse.urlsplit(url)
+        host = (p.netloc or '').lower()
+        return host.endswith('duckduckgo.com')
+    except Exception:
+        return False
+
+
+@functools.lru_cache(maxsize=8)
+def _pick_chrome_binary(explicit: Optional[str]) -> Optional[str]:
+    if explicit and os.path.exists(explicit):
+        return explicit
+    # Try common names/paths; stop at the first hit so later PATH walks are skipped
+    def candidates():
+        for name in ("google-chrome-stable", "google-chrome", "chromium-browser", "chromium"):
+            yield shutil.which(name)
+        yield from (
+            "/usr/bin/google-chrome-stable",
+            "/usr/bin/google-chrome",
+            "/usr/bin/chromium-browser",
+            "/usr/bin/chromium",
+        )
+    return next((path for path in candidates() if path and os.path.exists(path)), None)
+
+
+@functools.lru_cache(maxsize=8)
+def _resolve_driver(chosen_binary: Optional[str]) -> Optional[str]:
+    """Return a webdriver_manager ChromeDriver path matching the browser, or None.
+
+    Cached per binary so extra agents skip the version probe and install lookup.
+    Failures raise and are not cached.
+    """
+    # Determine browser type and major version for precise matching
+    try:
+        from webdriver_manager.core.utils import ChromeType
+    except Exception:
+        ChromeType = None  # type: ignore
+
+    browser_major = None
+    if chosen_binary and os.path.exists(chosen_binary):
+        try:
+            out = subprocess.check_output([chosen_binary, "--version"], text=True).strip()
+            m = re.search(r"(\d+)\.", out)
+            if m:
+                browser_major = int(m.group(1))
+        except Exception:
+            pass
+
+    ctype = None
+    if ChromeType is not None:
+        ctype = ChromeType.CHROMIUM if (chosen_binary and "chromium" in os.path.basename(chosen_binary)) else ChromeType.GOOGLE
+
+    if browser_major and ctype is not None:
+        return ChromeDriverManager(version=str(browser_major), chrome_type=ctype).install()
+    if ctype is not None:
+        return ChromeDriverManager(chrome_type=ctype).install()
+    return None
+
+
+def _maybe_rewrite_to_ddg(url: str) -> Optional[str]:
+    """Return the DuckDuckGo equivalent of a Google URL (keeping q=), or None if not Google."""
+    if _GOOGLE_TOKEN not in url:
+        return None
+    m = _GOOGLE_Q_RE.search(url)
+    q = urllib.parse.unquote_plus(m.group(1)) if m else ""
+    return "https://duckduckgo.com/" + ("?q=" + urllib.parse.quote(q) if q else "")
+
+
+# Matches checked for visibility per poll; each is_displayed() is a driver round trip
+_VISIBLE_SCAN_MAX = 5
+
+def _present_and_visible(locator):
+    # Expected condition: first displayed element matching locator, else False (keep polling).
+    # Later matches are only tried when the earlier ones are hidden, and at most a few per poll.
+    def _pred(drv):
+        for el in drv.find_elements(*locator)[:_VISIBLE_SCAN_MAX]:
+            try:
+                if el.is_displayed():
+                    return el
+            except StaleElementReferenceException:
+                continue
+        return False
+    return _pred
+
+
 class BrowserAgent:
     def __init__(self, headless: bool = False, binary: Optional[str] = None, detach: bool = True, nav_stop_seconds: float = 2.0, debug_port: Optional[int] = None):
+        _lazy_selenium()
         self.nav_stop_seconds = float(nav_stop_seconds) if nav_stop_seconds is not None else 0.0
         self.clicked_hrefs: set[str] = set()
         self.visited_urls: set[str] = set()
-        def pick_binary(explicit: Optional[str]) -> Optional[str]:
-            if explicit and os.path.exists(explicit):
-                return explicit
-            # Try common names/paths
-            candidates = [
-                explicit,
-                shutil.which("google-chrome-stable"),
-                shutil.which("google-chrome"),
-                shutil.which("chromium-browser"),
-                shutil.which("chromium"),
-                "/usr/bin/google-chrome-stable",
-                "/usr/bin/google-chrome",
-                "/usr/bin/chromium-browser",
-                "/usr/bin/chromium",
-            ]
-            for path in candidates:
-                if path and os.path.exists(path):
-                    return path
-            return None
-
         # If no GUI available and headed requested, fallback to headless.
-        # Only apply DISPLAY/WAYLAND checks on Linux; Windows/macOS don't set these in normal GUI sessions.
-        if sys.platform.startswith("linux"):
-            no_display = not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY")
-        else:
-            no_display = False
-        requested_headless = bool(headless)
-        effective_headless = requested_headless or no_display
+        effective_headless = bool(headless) or _LINUX_NO_DISPLAY
 
         opts = Options()
         # If we plan to stop loads manually, don't wait for full loads
@@ -243,7 +623,7 @@ class BrowserAgent:
                 opts.set_capability('pageLoadStrategy', 'none')
             except Exception:
                 pass
-        chosen_binary = pick_binary(binary)
+        chosen_binary = _pick_chrome_binary(binary)
         if chosen_binary:
             opts.binary_location = chosen_binary
         if effective_headless:
@@ -268,37 +648,11 @@ class BrowserAgent:
         service = None
         if HAVE_WDM:
             try:
-                # Determine browser type and major version for precise matching
-                try:
-                    from webdriver_manager.core.utils import ChromeType
-                except Exception:
-                    ChromeType = None  # type: ignore
-
-                browser_major = None
-                if chosen_binary and os.path.exists(chosen_binary):
-                    try:
-                        out = subprocess.check_output([chosen_binary, "--version"], text=True).strip()
-                        m = re.search(r"(\d+)\.", out)
-                        if m:
-                            browser_major = int(m.group(1))
-                    except Exception:
-                        pass
-
-                ctype = None
-                if ChromeType is not None:
-                    ctype = ChromeType.CHROMIUM if (chosen_binary and "chromium" in os.path.basename(chosen_binary)) else ChromeType.GOOGLE
-
-                if browser_major and ctype is not None:
-                    driver_path = ChromeDriverManager(version=str(browser_major), chrome_type=ctype).install()
-                    service = Service(driver_path)
-                elif ctype is not None:
-                    driver_path = ChromeDriverManager(chrome_type=ctype).install()
-                    service = Service(driver_path)
-                else:
-                    # Fallback: let Selenium Manager handle it
-                    service = None
+                driver_path = _resolve_driver(chosen_binary)
+                # None: let Selenium Manager handle it
+                service = Service(driver_path) if driver_path else None
             except Exception as e:
-                print(f"[WARN] webdriver_manager failed to resolve driver ({e}). Using Selenium Manager.", flush=True)
+                log.warning("webdriver_manager failed to resolve driver (%s). Using Selenium Manager.", e)
                 service = None
 
         def log_start(mode: str, extra: str = ""):
@@ -307,7 +661,7 @@ class BrowserAgent:
                 info.append(f"binary={chosen_binary}")
             if extra:
                 info.append(extra)
-            print("[INFO] Starting Chrome(" + ", ".join(info) + ")", flush=True)
+            log.info("Starting Chrome(%s)", ", ".join(info))
 
         # Try to start; if headed fails, retry headless as fallback
         try:
@@ -321,7 +675,7 @@ class BrowserAgent:
             if not effective_headless:
                 # Retry in headless mode
                 try:
-                    print(f"[WARN] Headed Chrome failed ({first_err}). Retrying headless...", flush=True)
+                    log.warning("Headed Chrome failed (%s). Retrying headless...", first_err)
                     opts.add_argument("--headless=new")
                     opts.add_argument("--window-size=1280,900")
                     log_start("headless", "fallback=from_headed")
@@ -344,40 +698,29 @@ class BrowserAgent:
                 self.driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "allow"})
             except Exception:
                 pass
-        self.wait = WebDriverWait(self.driver, 15)
-
-    def quit(self):
+        # Pin scrape helpers so every new document gets them without re-sending the source
         try:
-            self.driver.quit()
+            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": _PAGE_HELPERS_JS})
         except Exception:
             pass
+        self._waits: Dict[float, "WebDriverWait"] = {}
+        self.wait = self._get_wait(15)
 
-    # Helpers
+    def _get_wait(self, timeout: float) -> "WebDriverWait":
+        # One reusable wait per timeout; poll faster than the 0.5s default since most elements appear quickly
+        w = self._waits.get(timeout)
+        if w is None:
+            w = WebDriverWait(self.driver, timeout, poll_frequency=0.1)
+            self._waits[timeout] = w
+        return w
 
-    def _normalize_url(self, url: str) -> str:
+    def quit(self):
         try:
-            # Normalize scheme/host lowercase, drop fragment, clean trailing slash
-            p = urllib.parse.urlsplit(url)
-            scheme = (p.scheme or '').lower()
-            netloc = (p.netloc or '').lower()
-            path = p.path or '/'
-            if path != '/' and path.endswith('/'):
-                path = path[:-1]
-            query = (('?' + p.query) if p.query else '')
-            return f"{scheme}://{netloc}{path}{query}"
+            self.driver.quit()
         except Exception:
-            return url
+            pass
 
-    def _is_dup_exempt(self, url: str) -> bool:
-        """Return True if this URL should never be considered a duplicate.
-        Exempts all DuckDuckGo hosts (e.g., duckduckgo.com, lite.duckduckgo.com).
-        """
-        try:
-            p = urllib.parse.urlsplit(url)
-            host = (p.netloc or '').lower()
-            return host.endswith('duckduckgo.com')
-        except Exception:
-            return False
+    # Helpers
 
     def _xpath_literal(self, s: str) -> str:
         # Build a safe XPath string literal for any content
@@ -386,14 +729,7 @@ class BrowserAgent:
         if '"' not in s:
             return f'"{s}"'
         # String contains both single and double quotes: use concat('..', "'", '..')
-        parts = s.split("'")
-        out = ["concat("]
-        for idx, part in enumerate(parts):
-            if idx > 0:
-                out.append(',"\'",')
-            out.append(f"'{part}'")
-        out.append(")")
-        return "".join(out)
+        return "concat(" + ',"\'",'.join(f"'{part}'" for part in s.split("'")) + ")"
 
     def _resolve_locator(self, selector: str):
         sel = (selector or '').strip()
@@ -407,7 +743,7 @@ class BrowserAgent:
             return (By.XPATH, sel)
 
         # Playwright-style :has-text()
-        m = re.search(r"^([a-zA-Z0-9_*\-]+)?\s*:\s*has-text\((['\"])\s*(.*?)\s*\2\)\s*$", sel)
+        m = _HAS_TEXT_RE.search(sel)
         if m:
             tag = (m.group(1) or '*').strip()
             text_val = m.group(3)
@@ -417,7 +753,7 @@ class BrowserAgent:
 
         # Plain visible text selector (e.g., "Continue with Google")
         # If it doesn't look like a CSS selector, treat as a text match on clickable elements
-        if not re.search(r"[\.#\[:]", sel):
+        if not _CSS_SENTINEL_RE.search(sel):
             lit = self._xpath_literal(sel)
             xp = (
                 "//button[contains(normalize-space(.), {lit})] | "
@@ -432,11 +768,9 @@ class BrowserAgent:
 
     def _by_selector(self, selector: str):
         by, val = self._resolve_locator(selector)
-        # Wait for presence and visibility
+        # Wait for presence and visibility in a single poll loop
         try:
-            el = self.wait.until(EC.presence_of_element_located((by, val)))
-            el = self.wait.until(EC.visibility_of_element_located((by, val)))
-            return el
+            return self.wait.until(_present_and_visible((by, val)))
         except Exception:
             # As a fallback, try partial link text for anchors if the selector looks like plain text
             try:
@@ -453,28 +787,44 @@ class BrowserAgent:
             except Exception:
                 pass
 
+    def _evaluate(self, expression: str) -> Any:
+        # Runtime.evaluate hands back plain JSON values, skipping Selenium's result-wrapping layer
+        res = self.driver.execute_cdp_cmd("Runtime.evaluate", {
+            "expression": expression,
+            "returnByValue": True,
+            "awaitPromise": False,
+        })
+        details = res.get("exceptionDetails")
+        if details:
+            msg = (details.get("exception") or {}).get("description") or details.get("text")
+            raise RuntimeError(f"Page script failed: {msg}")
+        return (res.get("result") or {}).get("value")
+
+    def _page_call(self, fn: str, *args: Any) -> Any:
+        # Call a pinned page helper; install it on the fly if this document predates it
+        call = f"window.{fn}(" + ", ".join(json.dumps(a) for a in args) + ")"
+        res = self._evaluate(f"typeof window.{fn} === 'function' ? [{call}] : null")
+        if res is None:
+            res = self._evaluate(_PAGE_HELPERS_JS + f"\n[{call}]")
+        return res[0]
+
     def open_url(self, url: str):
-        # Prevent revisiting the same absolute URL
-        norm = self._normalize_url(url)
-        exempt = self._is_dup_exempt(norm)
-        # Local agent-level block (skip if exempt)
-        if (not exempt) and (norm in self.visited_urls):
-            raise ValueError(f"URL already visited: {norm}")
-        # Team-wide block (skip if exempt)
-        try:
-            with GLOBAL_VISITED_LOCK:
-                if (not exempt) and (norm in GLOBAL_VISITED_URLS):
-                    raise ValueError(f"URL already visited by another agent: {norm}")
-        except NameError:
-            # Globals may not exist in some contexts; ignore
-            pass
+        # Prevent revisiting the same absolute URL (sets hold normalized URLs)
+        norm = _norm_url_impl(url)
+        if not _dup_exempt_impl(norm):
+            # Local agent-level block
+            if norm in self.visited_urls:
+                raise ValueError(f"URL already visited: {norm}")
+            # Team-wide block; set membership is atomic under the GIL, so reads skip the lock
+            if norm in GLOBAL_VISITED_URLS:
+                raise ValueError(f"URL already visited by another agent: {norm}")
         self.driver.get(url)
         # Optionally stop loading after a short delay
         self._maybe_stop_loading()
         # Try to auto-accept common consent dialogs (e.g., Google)
         try:
-            cur = self.driver.current_url
-            if "google." in cur or "google." in url:
+            # Check the requested URL first so a Google target skips the current_url round trip
+            if _GOOGLE_TOKEN in url or _GOOGLE_TOKEN in self.driver.current_url:
                 candidates = [
                     "button#L2AGLb",  # EU consent "I agree"
                     "button[aria-label='Accept all']",
@@ -494,18 +844,30 @@ class BrowserAgent:
         except Exception:
             pass
         # Record visited URL
+        self._record_visit()
+
+    def safe_current_url(self) -> Optional[str]:
+        # None while the driver can't answer (mid-navigation, window gone) instead of raising
         try:
-            cur = self.driver.current_url
-            if cur:
-                cur_n = self._normalize_url(cur)
-                self.visited_urls.add(cur_n)
-                try:
-                    with GLOBAL_VISITED_LOCK:
-                        GLOBAL_VISITED_URLS.add(cur_n)
-                except NameError:
-                    pass
-        except Exception:
-            pass
+            return self.driver.current_url
+        except WebDriverException:
+            return None
+
+    def safe_scrape(self, selector: str = "viewport", max_chars: int = 1000) -> str:
+        # "" when the page can't be read; page-script failures surface as RuntimeError from _evaluate
+        try:
+            return self.scrape(selector, max_chars)
+        except (WebDriverException, RuntimeError):
+            return ""
+
+    def _record_visit(self):
+        # Mark the current page visited, for this agent and the whole team
+        cur = self.safe_current_url()
+        if cur:
+            cur_n = _norm_url_impl(cur)
+            self.visited_urls.add(cur_n)
+            with GLOBAL_VISITED_LOCK:
+                GLOBAL_VISITED_URLS.add(cur_n)
 
     def type(self, selector: str, text: str, submit: bool = False):
         # Wait for element to be interactable, then type. If not found, try common fallbacks.
@@ -571,16 +933,11 @@ class BrowserAgent:
                     el,
                 )
             if href:
-                norm = self._normalize_url(href)
-                # Disallow clicking a link we've already clicked or visited (unless exempt)
-                exempt = self._is_dup_exempt(norm)
-                blocked = (not exempt) and ((href in self.clicked_hrefs) or (norm in self.visited_urls))
-                # Team-wide block
-                try:
-                    with GLOBAL_VISITED_LOCK:
-                        blocked = blocked or ((not exempt) and (norm in GLOBAL_VISITED_URLS))
-                except NameError:
-                    pass
+                norm = _norm_url_impl(href)
+                # Disallow clicking a link we've already clicked or visited, locally or team-wide (unless exempt)
+                blocked = (not _dup_exempt_impl(norm)) and (
+                    (href in self.clicked_hrefs) or (norm in self.visited_urls) or (norm in GLOBAL_VISITED_URLS)
+                )
                 if blocked:
                     raise ValueError(f"Link already visited: {norm}")
                 self.clicked_hrefs.add(href)
@@ -590,18 +947,7 @@ class BrowserAgent:
         # If navigation likely started, optionally stop loading quickly
         self._maybe_stop_loading()
         # Record visited URL post-click
-        try:
-            cur = self.driver.current_url
-            if cur:
-                cur_n = self._normalize_url(cur)
-                self.visited_urls.add(cur_n)
-                try:
-                    with GLOBAL_VISITED_LOCK:
-                        GLOBAL_VISITED_URLS.add(cur_n)
-                except NameError:
-                    pass
-        except Exception:
-            pass
+        self._record_visit()
 
     def back(self):
         self.driver.back()
@@ -611,7 +957,7 @@ class BrowserAgent:
 
     def wait_for(self, selector: str, timeout: int = 15):
         by, val = self._resolve_locator(selector)
-        WebDriverWait(self.driver, timeout).until(EC.presence_of_element_located((by, val)))
+        self._get_wait(timeout).until(EC.presence_of_element_located((by, val)))
 
     def scroll(self, px: int = 1200):
         self.driver.execute_script(f"window.scrollBy(0, {px});")
@@ -626,125 +972,36 @@ class BrowserAgent:
         except Exception:
             # Fallback to viewport-visible content to avoid offscreen noise
             txt = self.scrape_visible(max_chars=max_chars)
-        txt = re.sub(r"\s+\n", "\n", txt)
-        txt = re.sub(r"\n{3,}", "\n\n", txt).strip()
+        txt = _WS_NL_RE.sub("\n", txt)
+        txt = _MULTI_NL_RE.sub("\n\n", txt).strip()
         if len(txt) > max_chars:
             txt = txt[:max_chars] + "…"
         return txt
 
     def scrape_visible(self, max_chars: int = 2000) -> str:
-        items = self.driver.execute_script(
-            r"""
-            const WH = window.innerHeight, WW = window.innerWidth;
-            function visible(el){
-              const cs = getComputedStyle(el);
-              if (cs.display === 'none' || cs.visibility === 'hidden' || parseFloat(cs.opacity||'1') === 0) return false;
-              const r = el.getBoundingClientRect();
-              if (r.bottom <= 0 || r.top >= WH || r.right <= 0 || r.left >= WW) return false;
-              const vert = Math.min(WH, r.bottom) - Math.max(0, r.top);
-              const horiz = Math.min(WW, r.right) - Math.max(0, r.left);
-              return vert >= 20 && horiz >= 20;
-            }
-            function norm(s){ return (s||'').replace(/\s+/g,' ').trim(); }
-            const selectors = 'h1,h2,h3,h4,h5,h6,main,article,section,p,li,a,button,[role=button],[role=link]';
-            const nodes = Array.from(document.querySelectorAll(selectors));
-            const seen = new Set();
-            const items = [];
-            for (const el of nodes){
-              if (!visible(el)) continue;
-              let txt = norm(el.innerText || el.textContent || '');
-              if (!txt || txt.length < 2) continue;
-              const r = el.getBoundingClientRect();
-              const tag = el.tagName.toLowerCase();
-              const href = (tag === 'a' && el.href) ? el.href : null;
-              const key = tag+':'+txt.slice(0,120)+':' + (href||'');
-              if (seen.has(key)) continue;
-              seen.add(key);
-              items.push({tag, txt, href, top:r.top, left:r.left});
-            }
-            items.sort((a,b)=> a.top - b.top || a.left - b.left);
-            return items;
-            """
-        )
-        lines: List[str] = []
-        def add_line(s: str):
-            if s:
-                lines.append(s)
-        for it in items:
-            tag = it.get("tag", "")
-            txt = (it.get("txt") or "").strip()
-            href = it.get("href")
-            if not txt:
-                continue
-            if tag == "h1":
-                add_line(f"== {txt} ==")
-            elif tag == "h2":
-                add_line(f"# {txt}")
-            elif tag == "h3":
-                add_line(f"## {txt}")
-            elif tag in ("a",):
-                if href:
-                    add_line(f"• {txt} — {href}")
-                else:
-                    add_line(f"• {txt}")
-            elif tag in ("button",):
-                add_line(f"[button] {txt}")
-            else:
-                add_line(txt)
-            if sum(len(x) + 1 for x in lines) >= max_chars:
-                break
-        out = "\n".join(lines)
-        out = re.sub(r"\n{3,}", "\n\n", out).strip()
+        # Lines are formatted in the page so only the final string crosses the driver bridge
+        out = self._page_call("__cq_scrape", int(max_chars)) or ""
+        out = _MULTI_NL_RE.sub("\n\n", out).strip()
         if len(out) > max_chars:
             out = out[:max_chars] + "…"
         return out
 
     def extract_links(self, selector: str = "a", limit: int = 10) -> List[Dict[str, str]]:
-        items = self.driver.execute_script(
-            r"""
-            const WH = window.innerHeight, WW = window.innerWidth;
-            function visible(el){
-              const cs = getComputedStyle(el);
-              if (cs.display === 'none' || cs.visibility === 'hidden' || parseFloat(cs.opacity||'1') === 0) return false;
-              const r = el.getBoundingClientRect();
-              if (r.bottom <= 0 || r.top >= WH || r.right <= 0 || r.left >= WW) return false;
-              const vert = Math.min(WH, r.bottom) - Math.max(0, r.top);
-              const horiz = Math.min(WW, r.right) - Math.max(0, r.left);
-              return vert >= 12 && horiz >= 12;
-            }
-            function norm(s){ return (s||'').replace(/\s+/g,' ').trim(); }
-            const nodes = Array.from(document.querySelectorAll('a[href^="http"]'));
-            const items = [];
-            for (const el of nodes){
-              if (!visible(el)) continue;
-              const txt = norm(el.innerText || el.textContent || '');
-              const href = el.href;
-              if (!href) continue;
-              const r = el.getBoundingClientRect();
-              items.push({text: txt, href: href, top: r.top, left: r.left});
-            }
-            items.sort((a,b)=> a.top - b.top || a.left - b.left);
-            return items;
-            """
-        )
+        items = self._page_call("__cq_links", int(limit)) or []
         links: List[Dict[str, str]] = []
+        # Bind the lookup sets once; reads of the shared set are GIL-atomic, so no per-link lock
+        clicked_local = self.clicked_hrefs
+        visited_local = self.visited_urls
+        visited_global = GLOBAL_VISITED_URLS
         for it in items:
             href = it.get("href")
             text = (it.get("text") or "").strip()
             if href and href.startswith("http"):
-                norm = self._normalize_url(href)
-                if self._is_dup_exempt(norm):
+                norm = _norm_url_impl(href)
+                if _dup_exempt_impl(norm):
                     clicked = False
                 else:
-                    clicked_local = href in getattr(self, 'clicked_hrefs', set())
-                    visited_local = norm in getattr(self, 'visited_urls', set())
-                    visited_global = False
-                    try:
-                        with GLOBAL_VISITED_LOCK:
-                            visited_global = norm in GLOBAL_VISITED_URLS
-                    except NameError:
-                        pass
-                    clicked = clicked_local or visited_local or visited_global
+                    clicked = (href in clicked_local) or (norm in visited_local) or (norm in visited_global)
                 # We keep only 'text' and 'href' public, but include 'clicked' for display and filtering
                 links.append({"text": text[:120], "href": href, "clicked": clicked})
             if len(links) >= limit:
@@ -760,36 +1017,26 @@ def _extract_balanced_json_object(s: str) -> Optional[str]:
     start = s.find("{")
     if start == -1:
         return None
+    # The regex engine skips over string literals; only braces and strings reach Python
     depth = 0
-    in_str = False
-    esc = False
-    quote = ""
-    for i in range(start, len(s)):
-        ch = s[i]
-        if in_str:
-            if esc:
-                esc = False
-            elif ch == "\\":
-                esc = True
-            elif ch == quote:
-                in_str = False
-        else:
-            if ch in ('"', "'"):
-                in_str = True
-                quote = ch
-            elif ch == '{':
-                depth += 1
-            elif ch == '}':
-                depth -= 1
-                if depth == 0:
-                    return s[start:i+1]
+    for m in _JSON_TOKEN_RE.finditer(s, start):
+        tok = m.group()
+        if tok == '{':
+            depth += 1
+        elif tok == '}':
+            depth -= 1
+            if depth == 0:
+                return s[start:m.end()]
+        elif m.group(1 if tok[0] == '"' else 2) is None:
+            # Unterminated string runs to the end, so the object never closes
+            return None
     return None
 
 
 def _strip_js_comments(s: str) -> str:
     # Remove // line comments and /* */ block comments safely
-    s = re.sub(r"(^|\s)//.*$", "", s, flags=re.MULTILINE)
-    s = re.sub(r"/\*.*?\*/", "", s, flags=re.DOTALL)
+    s = _LINE_COMMENT_RE.sub("", s)
+    s = _BLOCK_COMMENT_RE.sub("", s)
     return s
 
 
@@ -803,7 +1050,7 @@ def _parse_model_json_loose(raw: str) -> Dict[str, Any]:
     cleaned = strip_code_fences(raw)
     # Fast path: strict JSON
     try:
-        return json.loads(cleaned)
+        return _json_loads(cleaned)
     except Exception:
         pass
 
@@ -811,16 +1058,16 @@ def _parse_model_json_loose(raw: str) -> Dict[str, Any]:
     no_comments = _strip_js_comments(cleaned)
     candidate = _extract_balanced_json_object(no_comments) or no_comments.strip()
     try:
-        return json.loads(candidate)
+        return _json_loads(candidate)
     except Exception:
         pass
 
     # Last resort: tolerant Python-literal parsing
     try:
         import ast
-        py_like = re.sub(r"(?<![A-Za-z0-9_])true(?![A-Za-z0-9_])", "True", candidate)
-        py_like = re.sub(r"(?<![A-Za-z0-9_])false(?![A-Za-z0-9_])", "False", py_like)
-        py_like = re.sub(r"(?<![A-Za-z0-9_])null(?![A-Za-z0-9_])", "None", py_like)
+        py_like = _JS_TRUE_RE.sub("True", candidate)
+        py_like = _JS_FALSE_RE.sub("False", py_like)
+        py_like = _JS_NULL_RE.sub("None", py_like)
         obj = ast.literal_eval(py_like)
         if isinstance(obj, dict):
             return obj
@@ -830,25 +1077,142 @@ def _parse_model_json_loose(raw: str) -> Dict[str, Any]:
     raise ValueError(f"Model did not return valid JSON.\n{raw}")
 
 
-def plan_actions(llm: LLMClient, user_goal: str, context_snippets: List[str]) -> Dict[str, Any]:
+# Recent parsed plans keyed by prompt, so a stalled loop re-asking the same thing skips the LLM
+_PLAN_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_PLAN_CACHE_MAX = 128
+_PLAN_CACHE_LOCK = threading.Lock()
+
+# Observations kept in memory per run (default for --context-window); summarize_findings reads this many
+CONTEXT_WINDOW = 12
+# Most recent observations sent to the planner each round
+PLANNER_WINDOW = 3
+
+def _parse_plan(raw: str) -> Dict[str, Any]:
+    plan = _parse_model_json_loose(raw)
+    if "actions" not in plan or not isinstance(plan["actions"], list):
+        raise ValueError(f"Missing 'actions' list in model output.\n{plan}")
+    return plan
+
+def plan_actions(llm: LLMClient, user_goal: str, context_snippets: Sequence[str]) -> Dict[str, Any]:
+    recent = list(context_snippets)[-PLANNER_WINDOW:]
+    # A suppression note means the last plan stalled; replaying a cached answer for this
+    # context would repeat the stall, so ask the model afresh and don't store the result
+    stalled = any(snip.startswith(_SUPPRESS_PREFIXES) for snip in recent)
+    use_cache = not stalled and os.environ.get("LLM_CACHE_DISABLE") != "1"
+    key = hashlib.sha256(json.dumps([user_goal, recent], sort_keys=True).encode("utf-8")).hexdigest()
+    if use_cache:
+        with _PLAN_CACHE_LOCK:
+            cached = _PLAN_CACHE.get(key)
+            if cached is not None:
+                _PLAN_CACHE.move_to_end(key)
+        if cached is not None:
+            # Callers mutate actions (e.g. URL rewrites), so never hand out the cached object
+            return copy.deepcopy(cached)
     msgs = [
         {"role": "system", "content": SYSTEM_TOOLING},
         {"role": "user", "content": user_goal},
     ]
-    if context_snippets:
+    if recent:
         msgs.append({
             "role": "user",
-            "content": "Recent page snippets:\n" + "\n---\n".join(context_snippets[-3:])
+            "content": "Recent page snippets:\n" + "\n---\n".join(recent)
         })
-    raw = llm.chat(msgs, temperature=0.2)
-    plan = _parse_model_json_loose(raw)
-    if "actions" not in plan or not isinstance(plan["actions"], list):
-        raise ValueError(f"Missing 'actions' list in model output.\n{plan}")
+    plan = _parse_plan(llm.chat(msgs, temperature=0.2, validate=_parse_plan, cache=not stalled))
+    if use_cache:
+        with _PLAN_CACHE_LOCK:
+            _PLAN_CACHE[key] = copy.deepcopy(plan)
+            _PLAN_CACHE.move_to_end(key)
+            while len(_PLAN_CACHE) > _PLAN_CACHE_MAX:
+                _PLAN_CACHE.popitem(last=False)
     return plan
 
-def summarize_findings(llm: LLMClient, user_goal: str, context_snippets: List[str]) -> str:
-    # Use a slightly longer window to capture useful content
-    snippets = context_snippets[-12:] if context_snippets else []
+# Character budget for the observations sent to the summarizer
+SUMMARY_MAX_CHARS = 12000
+
+# Tokens found on more lines than this are skipped as edge evidence
+_TEXTRANK_MAX_POSTING = 32
+
+def _textrank_order(lines: List[str], iterations: int = 20, damping: float = 0.85, neighbors: int = 8) -> List[int]:
+    # TextRank over lines: edges weighted by shared keywords, PageRank-style power iteration.
+    # Each line keeps only its strongest few edges, and tokens are only matched across a bounded
+    # number of lines, so building the graph and iterating over it are both linear in the line count.
+    # Returns line indices, most central first.
+    n = len(lines)
+    toks = [frozenset(_WORD_RE.findall(ln.lower())) - STOPWORDS for ln in lines]
+    norm = [math.log(len(ts) + 1) for ts in toks]
+    postings: Dict[str, List[int]] = {}
+    for i, ts in enumerate(toks):
+        for t in ts:
+            postings.setdefault(t, []).append(i)
+    # Tokens on a large share of lines (scheme, site name, ...) link everything and say nothing;
+    # the fixed cap keeps a long spill log from turning the pair count quadratic
+    common = min(_TEXTRANK_MAX_POSTING, max(2, n // 5))
+    edges: List[Dict[int, float]] = [{} for _ in range(n)]
+    for i, ts in enumerate(toks):
+        shared: Dict[int, int] = {}
+        for t in ts:
+            ids = postings[t]
+            if len(ids) <= common:
+                for j in ids:
+                    shared[j] = shared.get(j, 0) + 1
+        shared.pop(i, None)
+        best = heapq.nlargest(neighbors, shared.items(), key=lambda jc: jc[1] / (norm[i] + norm[jc[0]]))
+        for j, c in best:
+            edges[i][j] = edges[j][i] = c / (norm[i] + norm[j])
+    # Fold each edge's share of the neighbour's out-weight in once, outside the loop
+    out_w = [sum(e.values()) or 1.0 for e in edges]
+    inbound = [[(j, w / out_w[j]) for j, w in e.items()] for e in edges]
+    score = [1.0] * n
+    for _ in range(iterations):
+        score = [(1 - damping) + damping * sum(score[j] * w for j, w in inb) for inb in inbound]
+    return sorted(range(n), key=score.__getitem__, reverse=True)
+
+# "[Agent-N]" attribution line that run_multi_agent puts at the top of each snippet
+_SNIPPET_HEADER_RE = re.compile(r"\[[^\]\n]+\]")
+
+def _compress_snippets(snippets: List[str], budget: int) -> List[str]:
+    # Keep the most central lines that fit the budget, in their original snippets and order.
+    # Lines repeated across snippets (nav text, the same links) are kept only where first seen.
+    # A leading attribution header is exempt from that and rides along with its snippet's lines.
+    owners: List[int] = []
+    lines: List[str] = []
+    heads: List[Optional[str]] = []
+    seen: set = set()
+    for si, snip in enumerate(snippets):
+        body = snip.splitlines()
+        head = body[0] if body and _SNIPPET_HEADER_RE.fullmatch(body[0]) else None
+        heads.append(head)
+        for ln in body[1:] if head is not None else body:
+            if ln.strip() and ln not in seen:
+                seen.add(ln)
+                owners.append(si)
+                lines.append(ln)
+    grouped: List[List[str]] = [[] for _ in snippets]
+    used = 0
+    for i in _textrank_order(lines):
+        si = owners[i]
+        cost = len(lines[i]) + 1
+        if not grouped[si] and heads[si] is not None:
+            cost += len(heads[si]) + 1
+        if used + cost <= budget:
+            grouped[si].append(i)
+            used += cost
+    out: List[str] = []
+    for si, g in enumerate(grouped):
+        if g:
+            kept = [lines[i] for i in sorted(g)]
+            out.append("\n".join([heads[si]] + kept if heads[si] is not None else kept))
+    return out
+
+def summarize_findings(llm: LLMClient, user_goal: str, context_snippets: Sequence[str], window: Optional[int] = CONTEXT_WINDOW) -> str:
+    # Use a slightly longer window to capture useful content (window=None: everything given);
+    # repeated notes only need saying once
+    snippets = list(context_snippets) if context_snippets else []
+    if window is not None:
+        snippets = snippets[-window:]
+    snippets = list(dict.fromkeys(snippets))
+    if sum(len(sn) for sn in snippets) > SUMMARY_MAX_CHARS:
+        snippets = _compress_snippets(snippets, SUMMARY_MAX_CHARS)
     obs = "\n---\n".join(snippets) if snippets else "(no observations)"
     msgs = [
         {"role": "system", "content": SUMMARY_SYSTEM},
@@ -860,6 +1224,128 @@ def summarize_findings(llm: LLMClient, user_goal: str, context_snippets: List[st
     except Exception as e:
         return f"Summary unavailable due to error: {e}"
 
+def _print_links(prefix: str, links: List[Dict[str, Any]]) -> None:
+    # Emit the whole block in one write/flush instead of a flushed print per link
+    out = [f"\n{prefix}[LINKS]\n"]
+    for idx, lk in enumerate(links, 1):
+        mark = " [clicked]" if lk.get("clicked") else ""
+        out.append(f"{prefix}{idx}. {mark} {lk['text'] or '(no text)'} — {lk['href']}\n")
+    out.append("\n")
+    sys.stdout.write("".join(out))
+    sys.stdout.flush()
+
+
+def _scrape_and_links(agent: BrowserAgent, selector: str, max_chars: int, link_selector: str, limit: int, prefix: str) -> Tuple[str, List[Dict[str, Any]]]:
+    # Auto-scrape every visited page and extract links to seed next steps
+    scrape = agent.scrape(selector, max_chars)
+    print(f"\n{prefix}[SCRAPE]\n" + scrape + "\n", flush=True)
+    links = agent.extract_links(link_selector, limit)
+    _print_links(prefix, links)
+    return scrape, links
+
+
+def _current_url_or(agent: Optional[BrowserAgent], cached: Optional[str]) -> Optional[str]:
+    # Reuse the URL recorded after the last action; only ask the driver when it's unknown
+    if cached is not None or agent is None:
+        return cached
+    return agent.safe_current_url()
+
+
+def _link_lines(links: List[Dict[str, Any]]) -> Iterator[str]:
+    # Observation lines for links; the caller joins them with the rest of the observation in one pass
+    for x in links:
+        mark = " [clicked]" if x.get("clicked") else ""
+        yield f"- {mark} {x['text'] or '(no text)'} — {x['href']}"
+
+
+# Actions whose observation doesn't need a fallback page snapshot: extract_links already returns
+# what the planner asked for, and a screenshot leaves the page as the previous step saw it.
+# open_url/click/back scrape as part of the action, so they never reach the fallback.
+_NO_FALLBACK_SCRAPE = frozenset({"extract_links", "screenshot"})
+
+
+def _url_and_body(agent: BrowserAgent, body_text: str, action_type: Optional[str]) -> Tuple[Optional[str], str]:
+    # Current URL (None if unreadable) plus page text for the observation.
+    # If the step didn't scrape, capture a lightweight body snapshot; both reads go one after
+    # the other on the agent's own driver, with no overlap.
+    if not body_text and action_type not in _NO_FALLBACK_SCRAPE:
+        body_text = agent.safe_scrape("viewport", 1000)
+    return agent.safe_current_url(), body_text
+
+
+# Identity of an action for duplicate/retry suppression: (type, selector, url, text prefix)
+_ActionSig = Tuple[str, str, str, str]
+
+
+def _action_sig(act: Dict[str, Any]) -> _ActionSig:
+    return (
+        str(act.get("type") or "").lower(),
+        str(act.get("selector") or ""),
+        str(act.get("url") or ""),
+        str(act.get("text") or "")[:64],
+    )
+
+
+# Why an action is skipped instead of executed; the value is the note fed back to the planner
+class Suppress(enum.Enum):
+    OK = ""
+    DUP = "Suppressed duplicate action: {sig}. Suggest trying a different selector or 'scrape' the viewport."
+    RETRY_CAP = "Retry limit reached for action: {sig}. Not executing again; propose an alternative approach."
+
+    def note(self, sig: _ActionSig) -> str:
+        return self.value.format(sig="|".join(sig))
+
+
+# Leading text of every suppression note, for spotting them in the planner's context
+_SUPPRESS_PREFIXES = tuple(r.value.split("{", 1)[0] for r in Suppress if r is not Suppress.OK)
+
+
+# Per-run action bookkeeping for the agent loops; __slots__ keeps it a fixed, dict-free record
+class LoopState:
+    __slots__ = ("last_sig", "consecutive_dupes", "last_action_type", "scrape_streak")
+
+    def __init__(self):
+        self.last_sig: Optional[_ActionSig] = None
+        self.consecutive_dupes = 0
+        self.last_action_type: Optional[str] = None
+        self.scrape_streak = 0
+
+    def see_sig(self, sig: _ActionSig) -> int:
+        # Record the next action's signature; returns how many times in a row it has repeated
+        self.consecutive_dupes = self.consecutive_dupes + 1 if sig == self.last_sig else 0
+        self.last_sig = sig
+        return self.consecutive_dupes
+
+
+def _suppress_reason(sig: _ActionSig, consecutive_dupes: int, fail_counts: Counter[_ActionSig], max_dupes: int, max_retries: int) -> Suppress:
+    if consecutive_dupes >= max_dupes:
+        return Suppress.DUP
+    # Counter lookups of unseen keys return 0 without inserting them
+    if fail_counts[sig] >= max_retries:
+        return Suppress.RETRY_CAP
+    return Suppress.OK
+
+
+# Fixed actions the loops substitute for the planner's choice. Shared, never mutated:
+# nothing after the substitution writes to next_action, and execute_actions only reads it.
+_DDG_HOME_ACTION: Dict[str, Any] = {"type": "open_url", "url": "https://duckduckgo.com/"}
+_DDG_LINKS_ACTION: Dict[str, Any] = {"type": "extract_links", "selector": "a", "limit": 10}
+_AUTO_SCREENSHOT_ACTION: Dict[str, Any] = {"type": "screenshot", "path": "auto_screenshot.png"}
+# Planner note for each back-to-back-scrape substitute, keyed by its action type
+_REPL_MSG: Dict[str, str] = {
+    "extract_links": "Suppressed back-to-back scrape; substituting with 'extract_links' on DDG results.",
+    "screenshot": "Suppressed back-to-back scrape; took a screenshot instead.",
+}
+
+
+# Observation stand-in when a step lands on text the planner has already seen
+_DUP_PAGE_NOTE = "Duplicate page: same text as an earlier step, text not repeated. Try a different link or query."
+
+
+# Actions that change the page; only these are followed by the settle delay
+_MUTATING_ACTIONS = frozenset({"type", "click", "open_url", "back", "scroll"})
+
+
 def execute_actions(agent: BrowserAgent, actions: List[Dict[str, Any]], label: str = "") -> Dict[str, Any]:
     last_scrape = ""
     last_links: List[Dict[str, str]] = []
@@ -867,19 +1353,13 @@ def execute_actions(agent: BrowserAgent, actions: List[Dict[str, Any]], label: s
         t = act.get("type", "").lower()
         try:
             prefix = (label + " ") if label else ""
-            print(f"{prefix}[DO] Step {i}: {t} {json.dumps(act, ensure_ascii=False)}", flush=True)
+            print(f"{prefix}[DO] Step {i}: {t} {_json_dumps(act)}", flush=True)
             if t == "open_url":
                 agent.open_url(act["url"])
-                # Auto-scrape every visited page
-                last_scrape = agent.scrape(act.get("selector", "viewport"), int(act.get("max_chars", 2000)))
-                print(f"\n{prefix}[SCRAPE]\n" + last_scrape + "\n", flush=True)
-                # Also extract links to seed next steps
-                last_links = agent.extract_links(act.get("link_selector", "a"), int(act.get("limit", 10)))
-                print(f"\n{prefix}[LINKS]", flush=True)
-                for idx, lk in enumerate(last_links, 1):
-                    mark = " [clicked]" if lk.get("clicked") else ""
-                    print(f"{prefix}{idx}. {mark} {lk['text'] or '(no text)'} — {lk['href']}", flush=True)
-                print()
+                last_scrape, last_links = _scrape_and_links(
+                    agent, act.get("selector", "viewport"), int(act.get("max_chars", 2000)),
+                    act.get("link_selector", "a"), int(act.get("limit", 10)), prefix,
+                )
             elif t == "type":
                 agent.type(act["selector"], act.get("text", ""), bool(act.get("submit", False)))
             elif t == "click":
@@ -916,15 +1396,10 @@ def execute_actions(agent: BrowserAgent, actions: List[Dict[str, Any]], label: s
                             raise e_click
                     else:
                         raise e_click
-                # Auto-scrape every visited page
-                last_scrape = agent.scrape(act.get("selector", "viewport"), int(act.get("max_chars", 2000)))
-                print(f"\n{prefix}[SCRAPE]\n" + last_scrape + "\n", flush=True)
-                last_links = agent.extract_links(act.get("link_selector", "a"), int(act.get("limit", 10)))
-                print(f"\n{prefix}[LINKS]", flush=True)
-                for idx, lk in enumerate(last_links, 1):
-                    mark = " [clicked]" if lk.get("clicked") else ""
-                    print(f"{prefix}{idx}. {mark} {lk['text'] or '(no text)'} — {lk['href']}", flush=True)
-                print()
+                last_scrape, last_links = _scrape_and_links(
+                    agent, act.get("selector", "viewport"), int(act.get("max_chars", 2000)),
+                    act.get("link_selector", "a"), int(act.get("limit", 10)), prefix,
+                )
             elif t == "wait_for":
                 agent.wait_for(act["selector"], int(act.get("timeout", 15)))
             elif t == "scroll":
@@ -934,106 +1409,163 @@ def execute_actions(agent: BrowserAgent, actions: List[Dict[str, Any]], label: s
                 print(f"\n{prefix}[SCRAPE]\n" + last_scrape + "\n", flush=True)
             elif t == "extract_links":
                 last_links = agent.extract_links(act.get("selector", "a"), int(act.get("limit", 10)))
-                print(f"\n{prefix}[LINKS]", flush=True)
-                for idx, lk in enumerate(last_links, 1):
-                    mark = " [clicked]" if lk.get("clicked") else ""
-                    print(f"{prefix}{idx}. {mark} {lk['text'] or '(no text)'} — {lk['href']}", flush=True)
-                print()
+                _print_links(prefix, last_links)
             elif t == "screenshot":
                 path = agent.screenshot(act.get("path", "screenshot.png"))
                 print(f"{prefix}[SCREENSHOT] saved to {path}", flush=True)
             elif t == "back":
                 agent.back()
                 # Auto-scrape after back navigation as well
-                last_scrape = agent.scrape("viewport", 2000)
-                print(f"\n{prefix}[SCRAPE]\n" + last_scrape + "\n", flush=True)
-                last_links = agent.extract_links("a", 10)
-                print(f"\n{prefix}[LINKS]", flush=True)
-                for idx, lk in enumerate(last_links, 1):
-                    mark = " [clicked]" if lk.get("clicked") else ""
-                    print(f"{prefix}{idx}. {mark} {lk['text'] or '(no text)'} — {lk['href']}", flush=True)
-                print()
+                last_scrape, last_links = _scrape_and_links(agent, "viewport", 2000, "a", 10, prefix)
             elif t == "done":
                 print(f"{prefix}[OK] done", flush=True)
                 break
             else:
-                print(f"{prefix}[WARN] Unknown action type: {t}", flush=True)
+                log.warning("%sUnknown action type: %s", prefix, t)
             print(f"{prefix}[OK] Step {i}: {t}", flush=True)
         except Exception as step_err:
-            print(f"{prefix}[ERROR] Step {i} failed: {t} — {step_err}", flush=True)
+            log.error("%sStep %d failed: %s — %s", prefix, i, t, step_err)
             raise
-        # Small delay to reduce flakiness
-        time.sleep(float(act.get("delay", 0.15)))
+        # Small settle delay after DOM-changing actions; pure reads go straight on
+        if t in _MUTATING_ACTIONS:
+            time.sleep(float(act.get("delay", 0.15)))
     return {"scrape": last_scrape, "links": last_links}
 
 
+def _save_summary(path: str, summary: str) -> None:
+    try:
+        Path(path).write_text(summary, encoding="utf-8")
+        log.info("Summary saved to %s", path)
+    except OSError as e:
+        log.warning("Could not save summary: %s", e)
+
+
 # Simple shared board for multi-agent collaboration
 class SharedBoard:
-    def __init__(self):
-        self._lock = threading.Lock()
-        self._notes: List[str] = []
+    # deque.append and list(deque) are atomic under the GIL, so no lock is needed;
+    # maxlen keeps memory bounded on long runs
+    def __init__(self, maxlen: int = 1024):
+        self._notes: Deque[str] = deque(maxlen=maxlen)
     def post(self, who: str, note: str):
-        ts = datetime.now().strftime('%H:%M:%S')
-        with self._lock:
-            self._notes.append(f"[{ts}] {who}: {note}")
+        ts = time.strftime('%H:%M:%S')
+        self._notes.append(f"[{ts}] {who}: {note}")
     def recent(self, n: int = 8) -> str:
+        return "\n".join(list(self._notes)[-n:])
+
+
+# Append-only JSON-lines log of every observation, so the summary can cover more than the in-memory window
+class ContextSpill:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._f = open(path, "a+", encoding="utf-8")
+        # Only entries written by this run are read back
+        self._start = self._f.tell()
+    def write(self, who: str, text: str):
+        line = _json_dumps({"who": who, "text": text}) + "\n"
+        with self._lock:
+            self._f.write(line)
+    def entries(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            self._f.flush()
+            self._f.seek(self._start)
+            data = self._f.read()
+        out: List[Tuple[str, str]] = []
+        bad = 0
+        # Records end in "\n" only; splitlines() would also break on U+2028/U+2029/U+0085 inside text
+        for ln in data.split("\n"):
+            if not ln:
+                continue
+            try:
+                rec = _json_loads(ln)
+                out.append((rec.get("who") or "", rec.get("text") or ""))
+            except Exception:
+                bad += 1
+        if bad:
+            log.warning("Skipped %d unreadable line(s) in the context spill log.", bad)
+        return out
+    def close(self):
         with self._lock:
-            return "\n".join(self._notes[-n:])
+            self._f.close()
+
+
+# Recent observations for prompting (bounded); each entry is also copied to the spill log when one is set
+class ContextWindow(deque):
+    def __init__(self, maxlen: int, spill: Optional[ContextSpill] = None, who: str = ""):
+        super().__init__(maxlen=maxlen)
+        self._spill = spill
+        self._who = who
+        # Page-text fingerprint per entry (None if the entry shows no page text), kept in step
+        self._page_sigs: Deque[Optional[bytes]] = deque(maxlen=maxlen)
+    def append(self, text: str, page_sig: Optional[bytes] = None):
+        if self._spill is not None:
+            self._spill.write(self._who, text)
+        super().append(text)
+        self._page_sigs.append(page_sig)
+    def shows_page(self, page_sig: bytes) -> bool:
+        # True while an entry with this page text is still among those the planner is sent
+        return page_sig in list(self._page_sigs)[-PLANNER_WINDOW:]
 
 
 def run_multi_agent(llm: LLMClient, args: argparse.Namespace, user_goal: str) -> None:
-    def action_signature_local(act: Dict[str, Any]) -> str:
-        t = (act.get("type") or "").lower()
-        sel = act.get("selector") or ""
-        url = act.get("url") or ""
-        txt = (act.get("text") or "")[:64]
-        return f"{t}|{sel}|{url}|{txt}"
-
     board = SharedBoard()
     results: Dict[str, Any] = {}
+    spill = ContextSpill(args.context_spill) if args.context_spill else None
+    # Pool threads can't be abandoned like daemon threads; on Ctrl-C workers stop after their current round
+    # and are waited for, so the summary and llm.close() never race a live worker
+    stop = threading.Event()
 
     def agent_worker(idx: int, who: str):
         goal_keywords = extract_keywords(user_goal)
-        context_snippets: List[str] = []
-        visited_urls: List[str] = []
+        # Compile the relevance matcher once for this agent's whole run
+        goal_matcher = _keyword_matcher(tuple(goal_keywords)) if goal_keywords else None
+        context_snippets = ContextWindow(args.context_window, spill, who)
+        # Distinct pages seen (O(1) membership) plus a bounded window for the prompt
+        visited_set: set[str] = set()
+        recent_visited: Deque[str] = deque(maxlen=5)
         last_url: Optional[str] = None
-        fail_counts: Dict[str, int] = {}
-        last_sig: Optional[str] = None
-        consecutive_dupes: int = 0
-        last_action_type: Optional[str] = None
-        scrape_streak: int = 0
+        # URL read after the last action; None means unknown and forces a driver read
+        cur_url_cache: Optional[str] = None
+        fail_counts: Counter[_ActionSig] = Counter()
+        state = LoopState()
         agent: Optional[BrowserAgent] = None
         label = f"[{who}]"
+        # Options read every round, bound once
+        relevance = args.relevance
+        explore_count = args.explore_count
+        suppress_scrapes = args.suppress_consecutive_scrapes
+        max_dupes = args.suppress_consecutive_duplicates
+        max_retries = args.max_retries_per_action
+        # Registered up front so an interrupted run still reaches the summary
+        results[who] = {"context": context_snippets}
         try:
             for round_idx in range(1, args.steps + 1):
+                if stop.is_set():
+                    log.info("%s Stopping early.", label)
+                    break
                 # Include recent team notes in the prompt context
                 team_obs = board.recent(6)
-                prompt_ctx = context_snippets[-3:] + (["Team notes:\n" + team_obs] if team_obs else [])
+                prompt_ctx = list(context_snippets)[-PLANNER_WINDOW:] + (["Team notes:\n" + team_obs] if team_obs else [])
                 plan = plan_actions(llm, user_goal, prompt_ctx)
                 actions = plan.get("actions", [])
                 next_action = actions[0] if actions else {}
                 print(f"\n{label} [NEXT {round_idx}] {plan.get('notes','')}")
                 print(label + " Action:")
-                print(textwrap.indent(json.dumps(next_action, indent=2), "  "))
+                print(textwrap.indent(_json_dumps(next_action, indent=True), "  "))
 
                 if (not next_action) or next_action.get("type", "").lower() == "done":
                     print(f"\n{label} [STATUS] Done per planner.")
                     break
 
                 if agent is None:
-                    print(f"{label} [INFO] Launching browser...", flush=True)
+                    log.info("%s Launching browser...", label)
                     agent = BrowserAgent(headless=args.headless, binary=args.binary, detach=True, nav_stop_seconds=args.nav_stop_seconds)
 
                 # Normalize Google -> DDG
                 try:
                     if (next_action.get("type","" ).lower() == "open_url"):
-                        url = str(next_action.get("url") or "")
-                        if "google." in url:
-                            parsed = urllib.parse.urlparse(url)
-                            qs = urllib.parse.parse_qs(parsed.query)
-                            q = (qs.get("q") or [""])[0]
-                            ddg_url = "https://duckduckgo.com/" + ("?q=" + urllib.parse.quote(q) if q else "")
-                            print(f"{label} [INFO] Rewriting Google URL to DuckDuckGo: {ddg_url}")
+                        ddg_url = _maybe_rewrite_to_ddg(str(next_action.get("url") or ""))
+                        if ddg_url:
+                            log.info("%s Rewriting Google URL to DuckDuckGo: %s", label, ddg_url)
                             next_action["url"] = ddg_url
                 except Exception:
                     pass
@@ -1042,15 +1574,10 @@ def run_multi_agent(llm: LLMClient, args: argparse.Namespace, user_goal: str) ->
                 try:
                     na_type = (next_action.get("type") or "").lower()
                     need_home = na_type in ("type", "extract_links", "scrape")
-                    cur = None
-                    try:
-                        if agent is not None:
-                            cur = agent.driver.current_url
-                    except Exception:
-                        cur = None
+                    cur = cur_url_cache = _current_url_or(agent, cur_url_cache)
                     if need_home and (not cur or cur == "about:blank"):
-                        print(f"{label} [INFO] No page loaded yet; opening DuckDuckGo home first.")
-                        next_action = {"type": "open_url", "url": "https://duckduckgo.com/"}
+                        log.info("%s No page loaded yet; opening DuckDuckGo home first.", label)
+                        next_action = _DDG_HOME_ACTION
                 except Exception:
                     pass
 
@@ -1058,96 +1585,76 @@ def run_multi_agent(llm: LLMClient, args: argparse.Namespace, user_goal: str) ->
                 try:
                     na_type = (next_action.get("type") or "").lower()
                     if na_type == "scrape":
-                        if last_action_type == "scrape" and args.suppress_consecutive_scrapes > 0:
-                            cur = None
-                            try:
-                                if agent is not None:
-                                    cur = agent.driver.current_url
-                            except Exception:
-                                cur = None
+                        if state.last_action_type == "scrape" and suppress_scrapes > 0:
+                            cur = cur_url_cache = _current_url_or(agent, cur_url_cache)
                             if cur and "duckduckgo.com" in cur:
-                                replacement = {"type": "extract_links", "selector": "a", "limit": 10}
+                                replacement = _DDG_LINKS_ACTION
                             else:
-                                replacement = {"type": "screenshot", "path": "auto_screenshot.png"}
-                            info = "Suppressed back-to-back scrape; substituting with 'extract_links' on DDG results." if replacement.get("type") == "extract_links" else "Suppressed back-to-back scrape; took a screenshot instead."
-                            print(f"{label} [INFO] {info}")
+                                replacement = _AUTO_SCREENSHOT_ACTION
+                            info = _REPL_MSG[replacement["type"]]
+                            log.info("%s %s", label, info)
                             context_snippets.append(info)
                             next_action = replacement
-                        scrape_streak = 1 if last_action_type != "scrape" else (scrape_streak + 1)
+                        state.scrape_streak = state.scrape_streak + 1 if state.last_action_type == "scrape" else 1
                     else:
-                        scrape_streak = 0
+                        state.scrape_streak = 0
                 except Exception:
                     pass
 
-                sig = action_signature_local(next_action)
-                if last_sig == sig:
-                    consecutive_dupes += 1
-                else:
-                    consecutive_dupes = 0
-                last_sig = sig
-                if consecutive_dupes >= args.suppress_consecutive_duplicates:
-                    note = f"Suppressed duplicate action: {sig}. Try different selector or scrape viewport."
-                    print(f"{label} [INFO] {note}")
-                    context_snippets.append(note)
-                    continue
-                if fail_counts.get(sig, 0) >= args.max_retries_per_action:
-                    note = f"Retry limit reached for action: {sig}. Skipping."
-                    print(f"{label} [INFO] {note}")
+                sig = _action_sig(next_action)
+                reason = _suppress_reason(sig, state.see_sig(sig), fail_counts, max_dupes, max_retries)
+                if reason is not Suppress.OK:
+                    note = reason.note(sig)
+                    log.info("%s %s", label, note)
                     context_snippets.append(note)
                     continue
 
+                # The action may navigate; forget the cached URL until it's re-read below
+                cur_url_cache = None
                 try:
                     result = execute_actions(agent, [next_action], label=label)
                     try:
-                        last_action_type = (next_action.get("type") or "").lower()
+                        state.last_action_type = (next_action.get("type") or "").lower()
                     except Exception:
-                        last_action_type = None
+                        state.last_action_type = None
                     observation_parts = []
-                    try:
-                        cur_url = agent.driver.current_url
+                    visited_changed = False
+                    cur_url, body_text = _url_and_body(agent, result.get("scrape") or "", state.last_action_type)
+                    if cur_url is not None:
+                        cur_url_cache = cur_url
                         if cur_url and cur_url != last_url:
-                            visited_urls.append(cur_url)
                             last_url = cur_url
+                            cur_key = _norm_url_impl(cur_url)
+                            if cur_key not in visited_set:
+                                visited_set.add(cur_key)
+                                recent_visited.append(cur_url)
+                                visited_changed = True
                         observation_parts.append(f"URL: {cur_url}")
-                    except Exception:
-                        pass
-                    body_text = result.get("scrape") or ""
-                    if not body_text:
-                        try:
-                            body_text = agent.scrape("viewport", 1000)
-                        except Exception:
-                            body_text = ""
-                    if body_text:
-                        filtered = filter_text_by_keywords(body_text, goal_keywords, mode=args.relevance, max_lines=80)
+                    # Duplicate only while the earlier copy is still in the planner's window
+                    page_sig = _page_signature(body_text) if body_text else None
+                    dup_page = page_sig is not None and context_snippets.shows_page(page_sig)
+                    if dup_page:
+                        observation_parts.append(_DUP_PAGE_NOTE)
+                    elif body_text:
+                        filtered = filter_text_by_keywords(body_text, goal_keywords, mode=relevance, max_lines=80, matcher=goal_matcher)
                         observation_parts.append(filtered)
                     if result.get("links"):
-                        filtered_links = filter_links_by_keywords(result["links"], goal_keywords, mode=args.relevance, max_keep=10)
-                        def fmt_link(x: Dict[str, Any]) -> str:
-                            mark = " [clicked]" if x.get("clicked") else ""
-                            return f"- {mark} {x['text'] or '(no text)'} — {x['href']}"
-                        joined = "\n".join([fmt_link(x) for x in filtered_links])
-                        observation_parts.append("Links:\n" + joined)
-                    if visited_urls:
-                        recent = "\n".join([f"- {u}" for u in visited_urls[-5:]])
-                        observation_parts.append(
-                            f"VisitedCount: {len(visited_urls)}/{args.explore_count}\nRecentlyVisited:\n{recent}"
-                        )
+                        filtered_links = filter_links_by_keywords(result["links"], goal_keywords, mode=relevance, max_keep=10, matcher=goal_matcher)
+                        observation_parts.append("Links:")
+                        observation_parts.extend(_link_lines(filtered_links))
+                    if visited_changed:
+                        observation_parts.append(f"VisitedCount: {len(visited_set)}/{explore_count}")
+                        observation_parts.append("RecentlyVisited:")
+                        observation_parts.extend(f"- {u}" for u in recent_visited)
                     if observation_parts:
-                        obs_joined = "\n".join(observation_parts)
-                        context_snippets.append(obs_joined)
+                        context_snippets.append("\n".join(observation_parts), None if dup_page else page_sig)
                         board.post(who, f"Round {round_idx}: {next_action.get('type')} → {last_url or ''}")
                 except Exception as act_err:
                     err_msg = f"Error during action {next_action}: {act_err}"
-                    print(f"{label} [WARN] {err_msg}")
+                    log.warning("%s %s", label, err_msg)
                     context_snippets.append(err_msg)
-                    try:
-                        sig  # type: ignore
-                        fail_counts[sig] = fail_counts.get(sig, 0) + 1
-                    except Exception:
-                        pass
+                    fail_counts[sig] += 1
                     board.post(who, f"Round {round_idx}: error {type(act_err).__name__}")
-
-            results[who] = {"context": context_snippets}
         finally:
             if agent and not args.keep_open:
                 try:
@@ -1156,34 +1663,36 @@ def run_multi_agent(llm: LLMClient, args: argparse.Namespace, user_goal: str) ->
                 except Exception:
                     pass
 
-    threads: List[threading.Thread] = []
-    for i in range(max(1, int(args.agents))):
-        who = f"Agent-{i+1}"
-        t = threading.Thread(target=agent_worker, args=(i, who), daemon=True)
-        threads.append(t)
-        t.start()
-
+    n_agents = max(1, int(args.agents))
+    pool = ThreadPoolExecutor(max_workers=n_agents, thread_name_prefix="agent")
+    futures = {pool.submit(agent_worker, i, f"Agent-{i+1}"): f"Agent-{i+1}" for i in range(n_agents)}
     try:
-        for t in threads:
-            t.join()
+        for fut in as_completed(futures):
+            err = fut.exception()
+            if err is not None:
+                log.warning("%s stopped with error: %s", futures[fut], err)
     except KeyboardInterrupt:
         print("\nInterrupted.")
+        stop.set()
+    finally:
+        pool.shutdown(wait=True)
 
     if args.summarize:
         all_ctx: List[str] = []
-        for who, data in results.items():
-            all_ctx.append(f"[{who}]\n" + "\n".join(data.get("context", [])[-8:]))
-        print("\n[INFO] Generating team summary...", flush=True)
-        summary = summarize_findings(llm, user_goal, all_ctx)
+        if spill is not None:
+            # Whole run from the spill log; summarize_findings compresses it to budget
+            all_ctx = [f"[{who}]\n{text}" for who, text in spill.entries()]
+        else:
+            for who, data in results.items():
+                all_ctx.append(f"[{who}]\n" + "\n".join(list(data.get("context", []))[-8:]))
+        log.info("Generating team summary...")
+        summary = summarize_findings(llm, user_goal, all_ctx, window=None if spill is not None else CONTEXT_WINDOW)
         print("\n[SUMMARY]\n" + summary)
         if args.summary_file:
-            try:
-                with open(args.summary_file, "w", encoding="utf-8") as f:
-                    f.write(summary)
-                print(f"[INFO] Summary saved to {args.summary_file}")
-            except Exception as e:
-                print(f"[WARN] Could not save summary: {e}")
+            _save_summary(args.summary_file, summary)
 
+    if spill is not None:
+        spill.close()
     print("\nAll agents finished.")
 
 def main():
@@ -1191,7 +1700,7 @@ def main():
     ap.add_argument("--api-key", default=DEFAULT_API_KEY, help="API key; or set env LLM_API_KEY.")
     ap.add_argument("--model", default=DEFAULT_MODEL, help="Model ID; or set env LLM_MODEL.")
     # Prefer provider mapping; allow custom endpoint override if provided explicitly
-    ap.add_argument("--provider", choices=sorted(PROVIDER_ENDPOINTS.keys()), default=os.environ.get("LLM_PROVIDER", "groq"), help="LLM provider (sets default endpoint).")
+    ap.add_argument("--provider", choices=_PROVIDER_CHOICES, default=os.environ.get("LLM_PROVIDER", "groq"), help="LLM provider (sets default endpoint).")
     ap.add_argument("--endpoint", default=None, help="OpenAI-compatible base URL (overrides --provider if set).")
     ap.add_argument("--binary", default=os.environ.get("CHROME_BINARY"), help="Path to Chromium/Chrome binary.")
     ap.add_argument("--headless", action="store_true", help="Run headless. Default is headed.")
@@ -1208,7 +1717,10 @@ def main():
     ap.add_argument("--suppress-consecutive-scrapes", type=int, default=1, help="If >0, do not allow more than this many 'scrape' actions back-to-back regardless of selector.")
     ap.add_argument("--nav-stop-seconds", type=float, default=2.0, help="After navigation or clicks/back, wait this many seconds then stop page loading (window.stop()). Set 0 to disable.")
     ap.add_argument("--agents", type=int, default=1, help="Run multiple collaborating agents in parallel (threads).")
+    ap.add_argument("--context-window", type=int, default=CONTEXT_WINDOW, help="Observations kept in memory per agent for prompts and the summary.")
+    ap.add_argument("--context-spill", default=None, help="Append every observation to this JSON-lines file; the summary then covers the whole run.")
     args = ap.parse_args()
+    args.context_window = max(1, args.context_window)
 
     if not args.prompt:
         print("Enter your goal (single line). Example: 'Search for latest AI news, open the first result, scrape the article body.'")
@@ -1218,7 +1730,7 @@ def main():
 
     # Validate API key early to avoid launching the browser unnecessarily
     if not args.api_key:
-        print("[ERROR] Missing API key. Pass --api-key or set env LLM_API_KEY.")
+        log.error("Missing API key. Pass --api-key or set env LLM_API_KEY.")
         return
 
     # Determine endpoint from provider unless a custom endpoint is given
@@ -1227,30 +1739,38 @@ def main():
 
     # If multi-agent requested, run the coordinator and exit
     if args.agents and args.agents > 1:
-        run_multi_agent(llm, args, user_goal)
+        try:
+            run_multi_agent(llm, args, user_goal)
+        finally:
+            llm.close()
         return
 
     # Defer launching the browser until we have a first action to run
     agent: Optional[BrowserAgent] = None
 
-    context_snippets: List[str] = []
-    visited_urls: List[str] = []
+    # Opened inside the try below so a bad --context-spill path still reaches the cleanup
+    spill: Optional[ContextSpill] = None
+    # Distinct pages seen (O(1) membership) plus a bounded window for the prompt
+    visited_set: set[str] = set()
+    recent_visited: Deque[str] = deque(maxlen=5)
     last_url: Optional[str] = None
+    # URL read after the last action; None means unknown and forces a driver read
+    cur_url_cache: Optional[str] = None
     goal_keywords = extract_keywords(user_goal)
+    # Compile the relevance matcher once for the whole run
+    goal_matcher = _keyword_matcher(tuple(goal_keywords)) if goal_keywords else None
     # Anti-spam tracking
-    def action_signature(act: Dict[str, Any]) -> str:
-        t = (act.get("type") or "").lower()
-        sel = act.get("selector") or ""
-        url = act.get("url") or ""
-        txt = (act.get("text") or "")[:64]
-        return f"{t}|{sel}|{url}|{txt}"
-
-    fail_counts: Dict[str, int] = {}
-    last_sig: Optional[str] = None
-    consecutive_dupes: int = 0
-    last_action_type: Optional[str] = None
-    scrape_streak: int = 0
+    fail_counts: Counter[_ActionSig] = Counter()
+    state = LoopState()
+    # Options read every round, bound once
+    relevance = args.relevance
+    explore_count = args.explore_count
+    suppress_scrapes = args.suppress_consecutive_scrapes
+    max_dupes = args.suppress_consecutive_duplicates
+    max_retries = args.max_retries_per_action
     try:
+        spill = ContextSpill(args.context_spill) if args.context_spill else None
+        context_snippets = ContextWindow(args.context_window, spill)
         for round_idx in range(1, args.steps + 1):
             # Ask for exactly one next action based on the latest observation
             plan = plan_actions(llm, user_goal, context_snippets)
@@ -1261,7 +1781,7 @@ def main():
             next_action = actions[0] if actions else {}
             print(f"\n[NEXT {round_idx}] {plan.get('notes','')}")
             print("Action:")
-            print(textwrap.indent(json.dumps(next_action, indent=2), "  "))
+            print(textwrap.indent(_json_dumps(next_action, indent=True), "  "))
 
             # Stop if planner signals done
             if (not next_action) or next_action.get("type", "").lower() == "done":
@@ -1270,21 +1790,18 @@ def main():
 
             # Launch the browser lazily on first execution
             if agent is None:
-                print("[INFO] Launching browser...", flush=True)
+                log.info("Launching browser...")
                 agent = BrowserAgent(headless=args.headless, binary=args.binary, detach=True, nav_stop_seconds=args.nav_stop_seconds)
 
             # Execute exactly one action (with de-duplication and retry suppression)
+            sig: Optional[_ActionSig] = None
             try:
                 # Enforce default to DuckDuckGo if planner tries Google open_url; preserve q= if present
                 try:
                     if (next_action.get("type","" ).lower() == "open_url"):
-                        url = str(next_action.get("url") or "")
-                        if "google." in url:
-                            parsed = urllib.parse.urlparse(url)
-                            qs = urllib.parse.parse_qs(parsed.query)
-                            q = (qs.get("q") or [""])[0]
-                            ddg_url = "https://duckduckgo.com/" + ("?q=" + urllib.parse.quote(q) if q else "")
-                            print(f"[INFO] Rewriting Google URL to DuckDuckGo: {ddg_url}")
+                        ddg_url = _maybe_rewrite_to_ddg(str(next_action.get("url") or ""))
+                        if ddg_url:
+                            log.info("Rewriting Google URL to DuckDuckGo: %s", ddg_url)
                             next_action["url"] = ddg_url
                 except Exception:
                     pass
@@ -1293,15 +1810,10 @@ def main():
                 try:
                     na_type = (next_action.get("type") or "").lower()
                     need_home = na_type in ("type", "extract_links", "scrape")
-                    cur = None
-                    try:
-                        if agent is not None:
-                            cur = agent.driver.current_url
-                    except Exception:
-                        cur = None
+                    cur = cur_url_cache = _current_url_or(agent, cur_url_cache)
                     if need_home and (not cur or cur == "about:blank"):
-                        print("[INFO] No page loaded yet; opening DuckDuckGo home first.")
-                        next_action = {"type": "open_url", "url": "https://duckduckgo.com/"}
+                        log.info("No page loaded yet; opening DuckDuckGo home first.")
+                        next_action = _DDG_HOME_ACTION
                 except Exception:
                     pass
 
@@ -1309,135 +1821,111 @@ def main():
                 try:
                     na_type = (next_action.get("type") or "").lower()
                     if na_type == "scrape":
-                        if last_action_type == "scrape" and args.suppress_consecutive_scrapes > 0:
+                        if state.last_action_type == "scrape" and suppress_scrapes > 0:
                             # Prefer extracting links on DDG, else take a screenshot
                             replacement: Dict[str, Any]
-                            cur = None
-                            try:
-                                if agent is not None:
-                                    cur = agent.driver.current_url
-                            except Exception:
-                                cur = None
+                            cur = cur_url_cache = _current_url_or(agent, cur_url_cache)
                             if cur and "duckduckgo.com" in cur:
-                                replacement = {"type": "extract_links", "selector": "a", "limit": 10}
+                                replacement = _DDG_LINKS_ACTION
                             else:
-                                replacement = {"type": "screenshot", "path": "auto_screenshot.png"}
-                            info = "Suppressed back-to-back scrape; substituting with 'extract_links' on DDG results." if replacement.get("type") == "extract_links" else "Suppressed back-to-back scrape; took a screenshot instead."
-                            print(f"[INFO] {info}")
+                                replacement = _AUTO_SCREENSHOT_ACTION
+                            info = _REPL_MSG[replacement["type"]]
+                            log.info("%s", info)
                             context_snippets.append(info)
                             next_action = replacement
                         # track streak for potential future tuning
-                        scrape_streak = 1 if last_action_type != "scrape" else (scrape_streak + 1)
+                        state.scrape_streak = state.scrape_streak + 1 if state.last_action_type == "scrape" else 1
                     else:
-                        scrape_streak = 0
+                        state.scrape_streak = 0
                 except Exception:
                     pass
 
-                sig = action_signature(next_action)
-                # Suppress consecutive duplicates
-                if last_sig == sig:
-                    consecutive_dupes += 1
-                else:
-                    consecutive_dupes = 0
-                last_sig = sig
-                if consecutive_dupes >= args.suppress_consecutive_duplicates:
-                    note = f"Suppressed duplicate action: {sig}. Suggest trying a different selector or 'scrape' the viewport."
-                    print(f"[INFO] {note}")
-                    context_snippets.append(note)
-                    continue
-                # Suppress excessive retries of the same failing action
-                if fail_counts.get(sig, 0) >= args.max_retries_per_action:
-                    note = f"Retry limit reached for action: {sig}. Not executing again; propose an alternative approach."
-                    print(f"[INFO] {note}")
+                sig = _action_sig(next_action)
+                # Suppress repeats and actions that keep failing, before any driver call
+                reason = _suppress_reason(sig, state.see_sig(sig), fail_counts, max_dupes, max_retries)
+                if reason is not Suppress.OK:
+                    note = reason.note(sig)
+                    log.info("%s", note)
                     context_snippets.append(note)
                     continue
 
+                # The action may navigate; forget the cached URL until it's re-read below
+                cur_url_cache = None
                 result = execute_actions(agent, [next_action])
                 try:
-                    last_action_type = (next_action.get("type") or "").lower()
+                    state.last_action_type = (next_action.get("type") or "").lower()
                 except Exception:
-                    last_action_type = None
+                    state.last_action_type = None
                 # Build observation for next turn
                 observation_parts = []
-                try:
-                    cur_url = agent.driver.current_url
+                visited_changed = False
+                cur_url, body_text = _url_and_body(agent, result.get("scrape") or "", state.last_action_type)
+                if cur_url is not None:
+                    cur_url_cache = cur_url
                     if cur_url and cur_url != last_url:
-                        visited_urls.append(cur_url)
                         last_url = cur_url
+                        cur_key = _norm_url_impl(cur_url)
+                        if cur_key not in visited_set:
+                            visited_set.add(cur_key)
+                            recent_visited.append(cur_url)
+                            visited_changed = True
                     observation_parts.append(f"URL: {cur_url}")
-                except Exception:
-                    pass
-                body_text = result.get("scrape") or ""
-                if not body_text:
-                    # If the step didn't scrape, capture a lightweight body snapshot
-                    try:
-                        body_text = agent.scrape("viewport", 1000)
-                    except Exception:
-                        body_text = ""
+                # Same text as a step the planner still sees: say so instead of resending it
+                page_sig = _page_signature(body_text) if body_text else None
+                dup_page = page_sig is not None and context_snippets.shows_page(page_sig)
+                if dup_page:
+                    observation_parts.append(_DUP_PAGE_NOTE)
                 # Relevance-filter the visible text
-                if body_text:
-                    filtered = filter_text_by_keywords(body_text, goal_keywords, mode=args.relevance, max_lines=80)
+                elif body_text:
+                    filtered = filter_text_by_keywords(body_text, goal_keywords, mode=relevance, max_lines=80, matcher=goal_matcher)
                     observation_parts.append(filtered)
                 # Relevance-filter the links list
                 if result.get("links"):
-                    filtered_links = filter_links_by_keywords(result["links"], goal_keywords, mode=args.relevance, max_keep=10)
-                    def fmt_link(x: Dict[str, Any]) -> str:
-                        mark = " [clicked]" if x.get("clicked") else ""
-                        return f"- {mark} {x['text'] or '(no text)'} — {x['href']}"
-                    joined = "\n".join([fmt_link(x) for x in filtered_links])
-                    observation_parts.append("Links:\n" + joined)
-                # Add exploration guidance and progress
-                if visited_urls:
-                    recent = "\n".join([f"- {u}" for u in visited_urls[-5:]])
-                    observation_parts.append(
-                        f"VisitedCount: {len(visited_urls)}/{args.explore_count}\nRecentlyVisited:\n{recent}"
-                    )
+                    filtered_links = filter_links_by_keywords(result["links"], goal_keywords, mode=relevance, max_keep=10, matcher=goal_matcher)
+                    observation_parts.append("Links:")
+                    observation_parts.extend(_link_lines(filtered_links))
+                # Add exploration guidance and progress, only when a new page was reached
+                if visited_changed:
+                    observation_parts.append(f"VisitedCount: {len(visited_set)}/{explore_count}")
+                    observation_parts.append("RecentlyVisited:")
+                    observation_parts.extend(f"- {u}" for u in recent_visited)
                 if observation_parts:
-                    context_snippets.append("\n".join(observation_parts))
+                    context_snippets.append("\n".join(observation_parts), None if dup_page else page_sig)
             except Exception as act_err:
                 # Feed error back into the next prompt as observation
                 err_msg = f"Error during action {next_action}: {act_err}"
-                print(f"[WARN] {err_msg}")
+                log.warning("%s", err_msg)
                 context_snippets.append(err_msg)
-                try:
-                    sig  # type: ignore
-                    fail_counts[sig] = fail_counts.get(sig, 0) + 1
-                except Exception:
-                    pass
+                if sig is not None:
+                    fail_counts[sig] += 1
                 # Continue to next turn to let the planner adapt
 
         # Optional end-of-run summary
         if args.summarize:
-            print("\n[INFO] Generating summary...", flush=True)
-            summary = summarize_findings(llm, user_goal, context_snippets)
+            log.info("Generating summary...")
+            if spill is not None:
+                summary = summarize_findings(llm, user_goal, [text for _, text in spill.entries()], window=None)
+            else:
+                summary = summarize_findings(llm, user_goal, context_snippets, window=args.context_window)
             print("\n[SUMMARY]\n" + summary)
             if args.summary_file:
-                try:
-                    with open(args.summary_file, "w", encoding="utf-8") as f:
-                        f.write(summary)
-                    print(f"[INFO] Summary saved to {args.summary_file}")
-                except Exception as e:
-                    print(f"[WARN] Could not save summary: {e}")
+                _save_summary(args.summary_file, summary)
 
         print("\nAll rounds finished.")
-        if agent and not args.keep_open:
-            print("Closing browser...")
-            agent.quit()
-        else:
+        if not agent or args.keep_open:
             print("Keeping browser open. Close it yourself when done.")
     except KeyboardInterrupt:
         print("\nInterrupted.")
     except Exception as e:
-        print(f"\n[ERROR] {e}")
+        log.error("%s", e)
     finally:
+        # Single close path for normal exit, errors and Ctrl-C; BrowserAgent.quit() never raises
         if agent and not args.keep_open:
-            try:
-                agent.quit()
-            except Exception:
-                pass
+            print("Closing browser...")
+            agent.quit()
+        if spill is not None:
+            spill.close()
+        llm.close()
 
 if __name__ == "__main__":
     main()
-# Global cross-agent visited URL tracking
-GLOBAL_VISITED_URLS: set[str] = set()
-GLOBAL_VISITED_LOCK = threading.Lock()